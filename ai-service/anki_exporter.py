@@ -1,11 +1,14 @@
 import genanki
+import hashlib
 import tempfile
 import os
 import logging
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any
 
 logger = logging.getLogger(__name__)
 
+SPOOL_MAX_BYTES = 16 * 1024 * 1024  # Decks up to 16MB are packaged without touching disk
+
 class AnkiExporter:
     def __init__(self):
         # Define basic note model for flashcards
@@ -131,6 +134,25 @@ small {
                 tags=[flashcard.get('difficulty', 'medium'), 'flashgen']
             )
 
+    def _build_deck(self, flashcards: List[Dict[str, Any]], deck_name: str) -> genanki.Deck:
+        """Build a genanki deck holding a note for every convertible flashcard"""
+        # Create deck with unique integer ID
+        # Convert deck name to a consistent integer ID
+        deck_hash = hashlib.md5(deck_name.encode()).hexdigest()
+        deck_id = int(deck_hash[:8], 16)  # Use first 8 chars as hex, convert to int
+        deck = genanki.Deck(deck_id, deck_name)
+        
+        # Convert flashcards to Anki notes and add to deck
+        for i, flashcard in enumerate(flashcards):
+            try:
+                note = self.convert_flashcard_to_anki_note(flashcard)
+                deck.add_note(note)
+            except Exception as e:
+                logger.warning(f"Failed to convert flashcard {i}: {e}")
+                continue
+        
+        return deck
+
     def create_anki_deck(self, flashcards: List[Dict[str, Any]], deck_name: str) -> str:
         """
         Create an Anki deck from flashcards and return the path to the .apkg file
@@ -145,21 +167,7 @@ small {
         try:
             logger.info(f"Creating Anki deck '{deck_name}' with {len(flashcards)} cards")
             
-            # Create deck with unique integer ID
-            # Convert deck name to a consistent integer ID
-            import hashlib
-            deck_hash = hashlib.md5(deck_name.encode()).hexdigest()
-            deck_id = int(deck_hash[:8], 16)  # Use first 8 chars as hex, convert to int
-            deck = genanki.Deck(deck_id, deck_name)
-            
-            # Convert flashcards to Anki notes and add to deck
-            for i, flashcard in enumerate(flashcards):
-                try:
-                    note = self.convert_flashcard_to_anki_note(flashcard)
-                    deck.add_note(note)
-                except Exception as e:
-                    logger.warning(f"Failed to convert flashcard {i}: {e}")
-                    continue
+            deck = self._build_deck(flashcards, deck_name)
             
             # Create temporary file for the package
             temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.apkg')
@@ -176,6 +184,35 @@ small {
             logger.error(f"Error creating Anki deck: {e}")
             raise
 
+    def create_anki_deck_bytes(self, flashcards: List[Dict[str, Any]], deck_name: str) -> bytes:
+        """
+        Create an Anki deck from flashcards and return the .apkg contents
+        
+        Args:
+            flashcards: List of flashcard dictionaries
+            deck_name: Name for the Anki deck
+            
+        Returns:
+            The generated .apkg file as bytes
+        """
+        try:
+            logger.info(f"Creating Anki deck '{deck_name}' with {len(flashcards)} cards in memory")
+            
+            deck = self._build_deck(flashcards, deck_name)
+            
+            # The package stays in RAM unless it outgrows the spool size
+            with tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES) as package_file:
+                genanki.Package(deck).write_to_file(package_file)
+                package_file.seek(0)
+                apkg_data = package_file.read()
+            
+            logger.info(f"Successfully created Anki package ({len(apkg_data)} bytes)")
+            return apkg_data
+            
+        except Exception as e:
+            logger.error(f"Error creating Anki deck: {e}")
+            raise
+
     def cleanup_temp_file(self, file_path: str):
         """Clean up temporary file"""
         try:
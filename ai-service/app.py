@@ -1,13 +1,16 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, send_file, g
 from flask_cors import CORS
+import io
 import logging
 import os
+import shutil
 import tempfile
-from werkzeug.utils import secure_filename
+import threading
 from dotenv import load_dotenv
-from gemini_generator import GeminiFlashcardGenerator
+from gemini_generator import GeminiFlashcardGenerator, InsufficientContentError
 from audio_transcriber import AudioTranscriber
 from anki_exporter import AnkiExporter
+from result_cache import get_cache, content_key, file_hash, DEFAULT_EXPIRE_SECONDS
 
 # Load environment variables
 load_dotenv()
@@ -28,7 +31,10 @@ logger = logging.getLogger(__name__)
 # Initialize generators
 try:
     flashcard_generator = GeminiFlashcardGenerator()
-    audio_transcriber = AudioTranscriber(model_size="base")  # Can be configured
+    audio_transcriber = AudioTranscriber(
+        model_size=os.getenv('WHISPER_MODEL', 'base'),  # Size name or OpenVINO export dir
+        num_workers=int(os.getenv('WHISPER_NUM_WORKERS', 1))
+    )
     anki_exporter = AnkiExporter()
     logger.info("AI services initialized successfully")
 except Exception as e:
@@ -42,11 +48,35 @@ app.config['MAX_CONTENT_LENGTH'] = 50 * 1024 * 1024  # 50MB max file size
 ALLOWED_TEXT_EXTENSIONS = {'txt', 'pdf'}
 ALLOWED_AUDIO_EXTENSIONS = {'mp3', 'wav', 'm4a', 'flac', 'aac', 'ogg'}
 
+# Bound concurrent Whisper runs so peak memory stays predictable under the threaded server.
+# Only faster-whisper actually decodes concurrently; the other backends serialize on a model lock
+transcription_semaphore = threading.BoundedSemaphore(int(os.getenv('MAX_CONCURRENT_TRANSCRIBE', 2)))
+
+def request_tmpdir():
+    """Temporary directory shared by everything in the current request, created on first use"""
+    if 'tmpdir' not in g:
+        g.tmpdir = tempfile.mkdtemp(prefix='recallai-')
+    return g.tmpdir
+
+@app.teardown_request
+def remove_request_tmpdir(exc):
+    """Remove the request's temporary directory and everything written to it"""
+    tmpdir = g.pop('tmpdir', None)
+    if tmpdir:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+
 def allowed_file(filename, allowed_extensions):
     """Check if file extension is allowed"""
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in allowed_extensions
 
+def parse_num_cards(value):
+    """Coerce a requested card count to an int of at least 1, None if it isn't a number"""
+    try:
+        return max(1, int(value))
+    except (TypeError, ValueError):
+        return None
+
 @app.route('/process', methods=['POST'])
 def process_text():
     """Process text content and generate flashcards"""
@@ -60,7 +90,9 @@ def process_text():
             return jsonify({"error": "No text provided"}), 400
 
         text = data['text']
-        num_cards = data.get('num_cards', 10)  # Default to 10 cards
+        num_cards = parse_num_cards(data.get('num_cards', 10))  # Default to 10 cards
+        if num_cards is None:
+            return jsonify({"error": "num_cards must be an integer"}), 400
         
         if not text.strip():
             logger.error("Empty text provided")
@@ -84,6 +116,9 @@ def process_text():
             "model": "gemini-1.5-pro-latest"
         })
 
+    except InsufficientContentError as e:
+        logger.warning(f"Rejected text: {str(e)}")
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         logger.error(f"Error processing text: {str(e)}")
         return jsonify({"error": "Internal server error during text processing"}), 500
@@ -97,6 +132,14 @@ def process_audio():
 
         # Check if file was uploaded
         if 'audio' not in request.files:
+            # Clients holding the ETag of an earlier result can skip the re-upload
+            for etag in request.if_none_match.as_set():
+                cached_response = get_cache().get(f"process-audio:{etag}")
+                if cached_response is not None:
+                    logger.info("Returning cached audio processing result for ETag")
+                    response = jsonify(cached_response)
+                    response.set_etag(etag)
+                    return response
             return jsonify({"error": "No audio file provided"}), 400
 
         file = request.files['audio']
@@ -109,62 +152,82 @@ def process_audio():
 
         # Get optional parameters
         language = request.form.get('language')  # Optional language hint
-        num_cards = int(request.form.get('num_cards', 10))
+        num_cards = parse_num_cards(request.form.get('num_cards', 10))
+        if num_cards is None:
+            return jsonify({"error": "num_cards must be an integer"}), 400
+        quality = request.form.get('quality', 'accurate')  # 'fast' uses the tiny model for short clips
 
         logger.info(f"Processing audio file: {file.filename}")
 
-        # Save uploaded file temporarily
-        temp_dir = tempfile.mkdtemp()
-        filename = secure_filename(file.filename)
-        temp_path = os.path.join(temp_dir, filename)
-        file.save(temp_path)
+        # Stream the upload into the request's temp dir (extension kept so ffmpeg can sniff the format)
+        temp_path = os.path.join(request_tmpdir(), f"upload{os.path.splitext(file.filename)[1].lower()}")
+        with open(temp_path, 'wb') as temp_file:
+            file.stream.seek(0)
+            shutil.copyfileobj(file.stream, temp_file, length=1 << 20)
+
+        # Identify the result by audio content and request parameters
+        audio_digest = file_hash(temp_path)
+        etag = content_key(audio_digest, language, num_cards, quality)
+
+        # Get audio info
+        audio_info = audio_transcriber.get_audio_info(temp_path)
+        logger.info(f"Audio info: {audio_info.get('duration_minutes', 0):.1f} minutes, {audio_info.get('file_size_mb', 0):.1f} MB")
+
+        # Transcribe audio; only real Whisper work waits for a transcription slot
+        transcription_result = AudioTranscriber.transcribe_long_audio.peek(
+            audio_transcriber, temp_path, language, quality, audio_digest=audio_digest
+        )
+        if transcription_result is None:
+            logger.info("Starting audio transcription")
+            with transcription_semaphore:
+                transcription_result = audio_transcriber.transcribe_long_audio(
+                    temp_path, language, quality, audio_digest=audio_digest
+                )
+        
+        transcribed_text = transcription_result["text"]
+        detected_language = transcription_result["language"]
+        
+        if not transcribed_text.strip():
+            return jsonify({"error": "No speech detected in audio file"}), 400
+
+        logger.info(f"Transcription completed. Text length: {len(transcribed_text)} characters, Language: {detected_language}")
+
+        # Generate flashcards from transcription
+        logger.info("Generating flashcards from transcription")
+        flashcards = flashcard_generator.generate_flashcards(transcribed_text, num_cards)
+        
+        if not flashcards:
+            return jsonify({"error": "Could not generate flashcards from the transcribed audio"}), 400
+
+        logger.info(f"Generated {len(flashcards)} flashcards from audio")
+
+        result = {
+            "success": True,
+            "flashcards": flashcards,
+            "count": len(flashcards),
+            "transcription": {
+                "text": transcribed_text,
+                "language": detected_language,
+                "duration": transcription_result["duration"],
+                "segments": transcription_result["segments"]
+            },
+            "audio_info": audio_info,
+            # Cached transcriptions from before the model was recorded ran on the main model
+            "model": f"gemini-1.5-pro-latest + whisper-{transcription_result.get('model', os.path.basename(audio_transcriber.model_size))}"
+        }
 
         try:
-            # Get audio info
-            audio_info = audio_transcriber.get_audio_info(temp_path)
-            logger.info(f"Audio info: {audio_info.get('duration_minutes', 0):.1f} minutes, {audio_info.get('file_size_mb', 0):.1f} MB")
+            get_cache().set(f"process-audio:{etag}", result, expire=DEFAULT_EXPIRE_SECONDS)
+        except Exception as e:
+            logger.warning(f"Failed to cache audio processing result: {e}")
 
-            # Transcribe audio
-            logger.info("Starting audio transcription")
-            transcription_result = audio_transcriber.transcribe_long_audio(temp_path, language)
-            
-            transcribed_text = transcription_result["text"]
-            detected_language = transcription_result["language"]
-            
-            if not transcribed_text.strip():
-                return jsonify({"error": "No speech detected in audio file"}), 400
-
-            logger.info(f"Transcription completed. Text length: {len(transcribed_text)} characters, Language: {detected_language}")
-
-            # Generate flashcards from transcription
-            logger.info("Generating flashcards from transcription")
-            flashcards = flashcard_generator.generate_flashcards(transcribed_text, num_cards)
-            
-            if not flashcards:
-                return jsonify({"error": "Could not generate flashcards from the transcribed audio"}), 400
-
-            logger.info(f"Generated {len(flashcards)} flashcards from audio")
-
-            return jsonify({
-                "success": True,
-                "flashcards": flashcards,
-                "count": len(flashcards),
-                "transcription": {
-                    "text": transcribed_text,
-                    "language": detected_language,
-                    "duration": transcription_result["duration"],
-                    "segments": transcription_result["segments"]
-                },
-                "audio_info": audio_info,
-                "model": "gemini-1.5-pro-latest + whisper-base"
-            })
-
-        finally:
-            # Clean up temporary files
-            if os.path.exists(temp_path):
-                os.unlink(temp_path)
-            os.rmdir(temp_dir)
+        response = jsonify(result)
+        response.set_etag(etag)
+        return response
 
+    except InsufficientContentError as e:
+        logger.warning(f"Rejected transcription: {str(e)}")
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         logger.error(f"Error processing audio: {str(e)}")
         return jsonify({"error": "Internal server error during audio processing"}), 500
@@ -191,34 +254,19 @@ def export_anki():
         logger.info(f"Exporting {len(flashcards)} flashcards to Anki deck: {deck_name}")
 
         # Create Anki deck
-        apkg_path = anki_exporter.create_anki_deck(flashcards, deck_name)
-        
-        try:
-            # Read the file and return it as response
-            with open(apkg_path, 'rb') as f:
-                apkg_data = f.read()
-            
-            # Clean up the temporary file
-            anki_exporter.cleanup_temp_file(apkg_path)
-            
-            logger.info(f"Successfully exported Anki deck with {len(flashcards)} cards")
-            
-            # Return the file data as base64 for frontend to download
-            import base64
-            apkg_base64 = base64.b64encode(apkg_data).decode('utf-8')
-            
-            return jsonify({
-                "success": True,
-                "filename": f"{deck_name}.apkg",
-                "data": apkg_base64,
-                "size": len(apkg_data),
-                "cards_exported": len(flashcards)
-            })
-            
-        except Exception as e:
-            # Ensure cleanup even if reading fails
-            anki_exporter.cleanup_temp_file(apkg_path)
-            raise e
+        # Package in memory; typical decks never touch the disk
+        apkg_data = anki_exporter.create_anki_deck_bytes(flashcards, deck_name)
+
+        logger.info(f"Successfully exported Anki deck with {len(flashcards)} cards")
+
+        # Send the binary package instead of base64-encoding it into JSON
+        return send_file(
+            io.BytesIO(apkg_data),
+            mimetype='application/octet-stream',
+            as_attachment=True,
+            download_name=f"{deck_name}.apkg",
+            max_age=0
+        )
 
     except Exception as e:
         logger.error(f"Error exporting to Anki: {str(e)}")
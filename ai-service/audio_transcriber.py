@@ -1,42 +1,243 @@
 import os
+import re
+import bisect
 import tempfile
 import logging
-from typing import Dict, Any, Optional, List
-import whisper
+import threading
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Optional, List, Tuple, Union
+import numpy as np
 from pydub import AudioSegment
 import ffmpeg
 from dotenv import load_dotenv
+from result_cache import cached, content_key, file_hash
+
+try:
+    from faster_whisper import WhisperModel
+except ImportError:  # Fall back to the reference PyTorch implementation
+    WhisperModel = None
+
+try:
+    import whisper
+except ImportError:
+    whisper = None
 
 # Load environment variables
 load_dotenv()
 
 logger = logging.getLogger(__name__)
 
+SAMPLE_RATE = 16000  # Whisper operates on 16kHz mono audio
+VAD_MIN_SILENCE_MS = 500
+FAST_MODEL_SIZE = "tiny"  # Used for language detection and quality='fast' short clips
+FAST_MAX_SECONDS = 60
+LANGUAGE_PROBE_SECONDS = 600  # Audio searched for the speech language detection runs on
+
+def _transcription_cache_key(transcriber, audio, language=None, quality="accurate", audio_digest=None) -> str:
+    """Key transcriptions on the audio content rather than the (temporary) upload path"""
+    if audio_digest is None:
+        audio_digest = file_hash(audio) if isinstance(audio, str) else content_key(np.ascontiguousarray(audio))
+    return content_key(transcriber.model_size, audio_digest, language, quality)
+
 class AudioTranscriber:
-    def __init__(self, model_size: str = "base"):
+    def __init__(self, model_size: str = "base", num_workers: Optional[int] = None):
         """
         Initialize Whisper audio transcriber
         
         Args:
-            model_size: Whisper model size ('tiny', 'base', 'small', 'medium', 'large')
+            model_size: Whisper model size ('tiny', 'base', 'small', 'medium', 'large'), or a local
+                directory holding an OpenVINO export (optimum-cli export openvino --weight-format int8)
+            num_workers: Parallel transcriptions for long audio segments (faster-whisper only). Each
+                worker holds its own model replica and gets cpu_count // num_workers threads, so
+                the default of 1 gives a single transcription every core
         """
         self.model_size = model_size
+        self.num_workers = num_workers or 1
         self.model = None
+        self.fast_model = None
+        self.processor = None
+        self.backend = None
+        self.vad_model = None
+        self.get_speech_timestamps = None
+        # Serializes the backends whose models can't be shared by concurrent requests
+        self._model_lock = threading.Lock()
         self.supported_formats = ['.mp3', '.wav', '.m4a', '.flac', '.aac', '.ogg', '.wma']
         
         # Load model lazily
         self._load_model()
+        
+        # faster-whisper ships Silero VAD; the other backends need it loaded separately
+        if self.backend in ("openai-whisper", "openvino"):
+            self._load_vad_model()
+        
+        # A tiny model handles the cheap passes (language detection, quick short clips)
+        if self.backend in ("faster-whisper", "openai-whisper") and self.model_size != FAST_MODEL_SIZE:
+            self._load_fast_model()
+    
+    def _model_guard(self):
+        """
+        Lock held while decoding on a shared model. faster-whisper is safe to call concurrently;
+        reference whisper installs kv-cache hooks on the shared decoder per decode, and the
+        OpenVINO model and Silero VAD keep per-call state, so those backends run one at a time.
+        """
+        return nullcontext() if self.backend == "faster-whisper" else self._model_lock
     
     def _load_model(self):
-        """Load Whisper model"""
+        """Load Whisper model (OpenVINO export, faster-whisper int8 or reference whisper, in that order)"""
         try:
             logger.info(f"Loading Whisper model: {self.model_size}")
-            self.model = whisper.load_model(self.model_size)
-            logger.info("Whisper model loaded successfully")
+            if os.path.isdir(self.model_size) and self._load_openvino_model():
+                pass  # Static-shape int8 OpenVINO export
+            elif WhisperModel is not None:
+                # CTranslate2 int8 kernels are considerably faster than FP32 PyTorch on CPU.
+                # cpu_threads is per worker and one transcribe() call runs on one worker, so cores are
+                # only divided when num_workers > 1 asks for parallel segments (each costs a model replica)
+                self.model = WhisperModel(
+                    self.model_size,
+                    device="cpu",
+                    compute_type="int8",
+                    cpu_threads=max(1, (os.cpu_count() or 1) // self.num_workers),
+                    num_workers=self.num_workers
+                )
+                self.backend = "faster-whisper"
+            elif whisper is not None:
+                self.model = whisper.load_model(self.model_size)
+                self.backend = "openai-whisper"
+                self._compile_openai_model()
+            else:
+                raise ImportError("Neither faster-whisper nor openai-whisper is installed")
+            logger.info(f"Whisper model loaded successfully ({self.backend})")
         except Exception as e:
             logger.error(f"Failed to load Whisper model: {e}")
             raise
 
+    def _load_fast_model(self):
+        """Load the tiny Whisper model on the same backend as the main model"""
+        try:
+            if self.backend == "faster-whisper":
+                self.fast_model = WhisperModel(
+                    FAST_MODEL_SIZE,
+                    device="cpu",
+                    compute_type="int8",
+                    cpu_threads=os.cpu_count() or 1,
+                    num_workers=1
+                )
+            else:
+                self.fast_model = whisper.load_model(FAST_MODEL_SIZE)
+            logger.info(f"Fast Whisper model loaded: {FAST_MODEL_SIZE}")
+        except Exception as e:
+            # Routing is an optimization only; the main model handles everything without it
+            logger.warning(f"Failed to load fast Whisper model, using {self.model_size} only: {e}")
+            self.fast_model = None
+
+    def _compile_openai_model(self):
+        """Fuse reference whisper's encoder/decoder kernels with torch.compile (PyTorch >= 2.1)"""
+        import torch
+        
+        if not hasattr(torch, "compile"):
+            return
+        
+        try:
+            self.model.encoder = torch.compile(self.model.encoder, mode='reduce-overhead', fullgraph=False)
+            self.model.decoder = torch.compile(self.model.decoder, mode='reduce-overhead', fullgraph=False)
+            
+            # Warm up on a second of silence so the first request doesn't pay the compile cost
+            with torch.inference_mode():
+                self.model.transcribe(np.zeros(SAMPLE_RATE, dtype=np.float32), language="en", verbose=None)
+            logger.info("Whisper encoder/decoder compiled")
+        except Exception as e:
+            # Compilation is an optimization only; fall back to eager mode
+            logger.warning(f"torch.compile failed, using eager Whisper model: {e}")
+            self.model = whisper.load_model(self.model_size)
+
+    def _load_openvino_model(self) -> bool:
+        """
+        Load a statically exported int8 Whisper model with the OpenVINO runtime
+        
+        Returns:
+            True if loaded, False if optimum-intel is unavailable or the export is unusable
+        """
+        try:
+            from optimum.intel import OVModelForSpeechSeq2Seq
+            from transformers import AutoProcessor
+            
+            self.processor = AutoProcessor.from_pretrained(self.model_size)
+            self.model = OVModelForSpeechSeq2Seq.from_pretrained(self.model_size, device='CPU')
+            self.backend = "openvino"
+            return True
+        except Exception as e:
+            logger.warning(f"Failed to load OpenVINO model from {self.model_size}, falling back: {e}")
+            self.processor = None
+            self.model = None
+            return False
+
+    def _load_vad_model(self):
+        """Load Silero VAD used to strip silence before reference whisper decoding"""
+        try:
+            import torch
+            self.vad_model, vad_utils = torch.hub.load('snakers4/silero-vad', 'silero_vad', trust_repo=True)
+            self.get_speech_timestamps = vad_utils[0]
+            logger.info("Silero VAD model loaded successfully")
+        except Exception as e:
+            # VAD is an optimization only; transcribe the full audio without it
+            logger.warning(f"Failed to load Silero VAD model, silence will not be skipped: {e}")
+            self.vad_model = None
+            self.get_speech_timestamps = None
+
+    def _remove_silence(self, audio):
+        """
+        Drop non-speech regions from a 16kHz mono waveform
+        
+        Args:
+            audio: float32 numpy waveform
+            
+        Returns:
+            Tuple of (speech-only waveform, list of (start, end) sample spans kept)
+        """
+        import torch
+        
+        spans = self.get_speech_timestamps(
+            torch.from_numpy(audio),
+            self.vad_model,
+            sampling_rate=SAMPLE_RATE,
+            min_silence_duration_ms=VAD_MIN_SILENCE_MS
+        )
+        spans = [(span["start"], span["end"]) for span in spans]
+        if not spans:
+            return audio[:0], spans
+        
+        speech = np.concatenate([audio[start:end] for start, end in spans])
+        logger.info(f"VAD kept {len(speech) / SAMPLE_RATE:.1f}s of {len(audio) / SAMPLE_RATE:.1f}s audio")
+        return speech, spans
+
+    def _restore_timestamps(self, result: Dict[str, Any], spans: List[tuple]) -> None:
+        """
+        Map timestamps on the speech-only waveform back onto the original timeline
+        
+        Args:
+            result: Whisper transcribe() result, adjusted in place
+            spans: (start, end) sample spans returned by _remove_silence
+        """
+        # Position of each kept span on the condensed timeline
+        span_starts = []
+        position = 0
+        for start, end in spans:
+            span_starts.append(position)
+            position += end - start
+        
+        def restore(seconds: float) -> float:
+            sample = seconds * SAMPLE_RATE
+            index = max(bisect.bisect_right(span_starts, sample) - 1, 0)
+            return (spans[index][0] + sample - span_starts[index]) / SAMPLE_RATE
+        
+        for segment in result["segments"]:
+            segment["start"] = restore(segment["start"])
+            segment["end"] = restore(segment["end"])
+            for word in segment.get("words", []):
+                word["start"] = restore(word["start"])
+                word["end"] = restore(word["end"])
+
     def is_supported_format(self, file_path: str) -> bool:
         """Check if audio format is supported"""
         _, ext = os.path.splitext(file_path.lower())
@@ -74,53 +275,253 @@ class AudioTranscriber:
             logger.error(f"Audio conversion failed: {e}")
             raise
 
-    def segment_long_audio(self, audio_path: str, max_duration_minutes: int = 30) -> List[str]:
+    def _decode_to_array(self, audio_path: str) -> Tuple[np.ndarray, int]:
         """
-        Split long audio files into smaller segments for processing
+        Decode audio to a 16kHz mono float32 waveform in a single ffmpeg pass
         
         Args:
             audio_path: Path to audio file
-            max_duration_minutes: Maximum duration per segment in minutes
             
         Returns:
-            List of paths to audio segments
+            Tuple of (waveform normalized to [-1.0, 1.0), sample rate)
         """
         try:
-            audio = AudioSegment.from_file(audio_path)
-            duration_ms = len(audio)
-            max_duration_ms = max_duration_minutes * 60 * 1000
-            
-            if duration_ms <= max_duration_ms:
-                return [audio_path]
-            
-            segments = []
-            segment_count = (duration_ms // max_duration_ms) + 1
+            # Stream raw int16 PCM over stdout instead of writing an intermediate WAV file
+            out, _ = (
+                ffmpeg
+                .input(audio_path)
+                .output('pipe:', format='s16le', acodec='pcm_s16le', ac=1, ar=SAMPLE_RATE)
+                .run(capture_stdout=True, capture_stderr=True)
+            )
+        except ffmpeg.Error as e:
+            logger.error(f"Audio decoding failed: {e.stderr.decode(errors='ignore') if e.stderr else e}")
+            raise
+        
+        # Scale in place rather than allocating a second float32 copy of the whole recording
+        pcm = np.frombuffer(out, np.int16).astype(np.float32)
+        pcm /= 32768.0
+        return pcm, SAMPLE_RATE
+
+    def segment_long_audio(self, audio: np.ndarray, max_duration_minutes: int = 30) -> List[np.ndarray]:
+        """
+        Split long audio into smaller segments for processing
+        
+        Args:
+            audio: 16kHz mono float32 waveform
+            max_duration_minutes: Maximum duration per segment in minutes
             
-            logger.info(f"Splitting audio into {segment_count} segments")
+        Returns:
+            List of waveform views (no copies or temporary files)
+        """
+        max_samples = max_duration_minutes * 60 * SAMPLE_RATE
+        
+        if len(audio) <= max_samples:
+            return [audio]
+        
+        segments = [audio[start:start + max_samples] for start in range(0, len(audio), max_samples)]
+        
+        logger.info(f"Splitting audio into {len(segments)} segments")
+        
+        return segments
+
+    def detect_language(self, audio: np.ndarray) -> Optional[str]:
+        """
+        Detect the spoken language from the first 30 seconds of speech using the fast model
+        
+        Args:
+            audio: 16kHz mono float32 waveform
             
-            for i in range(segment_count):
-                start_ms = i * max_duration_ms
-                end_ms = min((i + 1) * max_duration_ms, duration_ms)
+        Returns:
+            Language code, or None if no fast model is loaded or no speech was found
+        """
+        if self.fast_model is None:
+            return None
+        
+        try:
+            # Silent or music intros are skipped, as the main model's own detection would
+            audio = audio[:LANGUAGE_PROBE_SECONDS * SAMPLE_RATE]
+            if self.backend == "faster-whisper":
+                # VAD runs before detection; the lazy segment generator is never consumed
+                _, info = self.fast_model.transcribe(
+                    audio,
+                    beam_size=1,
+                    vad_filter=True,
+                    vad_parameters=dict(min_silence_duration_ms=VAD_MIN_SILENCE_MS)
+                )
+                language = info.language
+            else:
+                # Without VAD the tiny model would guess from whatever the recording opens with
+                if self.vad_model is None:
+                    return None
+                
+                import torch
                 
-                segment = audio[start_ms:end_ms]
-                segment_path = tempfile.mktemp(suffix=f'_segment_{i}.wav')
-                segment.export(segment_path, format="wav")
-                segments.append(segment_path)
+                with self._model_guard():
+                    speech, spans = self._remove_silence(audio)
+                    if not spans:
+                        return None
+                    mel = whisper.log_mel_spectrogram(whisper.pad_or_trim(speech[:30 * SAMPLE_RATE]))
+                    with torch.inference_mode():
+                        _, probs = self.fast_model.detect_language(mel.to(self.fast_model.device))
+                language = max(probs, key=probs.get)
+            
+            logger.info(f"Detected language with {FAST_MODEL_SIZE} model: {language}")
+            return language
+        except Exception as e:
+            logger.warning(f"Fast language detection failed, leaving it to the main model: {e}")
+            return None
+
+    def _transcribe_faster_whisper(self, audio, language: Optional[str] = None, model=None) -> Dict[str, Any]:
+        """
+        Run faster-whisper and map its output onto the reference whisper result schema
+        
+        Args:
+            audio: Path to audio file or 16kHz mono float32 waveform
+            language: Language code (optional, auto-detect if None)
+            model: WhisperModel to use instead of the main model (optional)
             
-            return segments
+        Returns:
+            Dict with "text", "language" and "segments" like whisper's transcribe()
+        """
+        segments, info = (model or self.model).transcribe(
+            audio,
+            language=language,
+            word_timestamps=True,
+            vad_filter=True,
+            vad_parameters=dict(min_silence_duration_ms=VAD_MIN_SILENCE_MS),
+            beam_size=1
+        )
+        
+        # The segments generator is lazy; decoding happens while we iterate it
+        result_segments = []
+        for segment in segments:
+            result_segments.append({
+                "start": segment.start,
+                "end": segment.end,
+                "text": segment.text,
+                "words": [
+                    {"word": word.word, "start": word.start, "end": word.end}
+                    for word in (segment.words or [])
+                ]
+            })
+        
+        return {
+            "text": "".join(segment["text"] for segment in result_segments),
+            "language": info.language,
+            "segments": result_segments
+        }
+
+    def _transcribe_openai_whisper(self, audio: np.ndarray, language: Optional[str] = None, model=None) -> Dict[str, Any]:
+        """
+        Run reference whisper on a waveform, skipping silence when VAD is available
+        
+        Args:
+            audio: 16kHz mono float32 waveform
+            language: Language code (optional, auto-detect if None)
+            model: Whisper model to use instead of the main model (optional)
             
-        except Exception as e:
-            logger.error(f"Audio segmentation failed: {e}")
-            raise
+        Returns:
+            Whisper transcribe() result
+        """
+        spans = None
+        if self.vad_model is not None:
+            audio, spans = self._remove_silence(audio)
+            if not spans:
+                return {"text": "", "language": language, "segments": []}
+        
+        import torch
+        
+        # inference_mode also drops autograd view tracking, unlike no_grad
+        with torch.inference_mode():
+            result = (model or self.model).transcribe(
+                audio,
+                language=language,
+                verbose=False,
+                word_timestamps=True
+            )
+        
+        if spans:
+            self._restore_timestamps(result, spans)
+        
+        return result
+
+    def _language_from_tokens(self, token_ids) -> Optional[str]:
+        """Read the language token (e.g. <|en|>) Whisper emits at the start of its output"""
+        for token in self.processor.tokenizer.convert_ids_to_tokens(token_ids[:4].tolist()):
+            match = re.fullmatch(r'<\|([a-z]{2,3})\|>', token)
+            if match:
+                return match.group(1)
+        return None
 
-    def transcribe_audio(self, audio_path: str, language: Optional[str] = None) -> Dict[str, Any]:
+    def _transcribe_openvino(self, audio: np.ndarray, language: Optional[str] = None) -> Dict[str, Any]:
         """
-        Transcribe audio file using Whisper
+        Run the OpenVINO Whisper export on a waveform, one 30 second window at a time
         
         Args:
-            audio_path: Path to audio file
+            audio: 16kHz mono float32 waveform
             language: Language code (optional, auto-detect if None)
             
+        Returns:
+            Dict with "text", "language" and "segments" like whisper's transcribe()
+        """
+        spans = None
+        if self.vad_model is not None:
+            audio, spans = self._remove_silence(audio)
+            if not spans:
+                return {"text": "", "language": language, "segments": []}
+        
+        # The export has static input shapes covering Whisper's 30 second mel window
+        window = 30 * SAMPLE_RATE
+        generate_kwargs = {"return_timestamps": True}
+        if language:
+            generate_kwargs["language"] = language
+        
+        detected_language = language
+        result_segments = []
+        for start in range(0, len(audio), window):
+            chunk = audio[start:start + window]
+            features = self.processor(chunk, sampling_rate=SAMPLE_RATE, return_tensors='pt').input_features
+            output = self.model.generate(features, **generate_kwargs)
+            
+            if detected_language is None:
+                detected_language = self._language_from_tokens(output[0])
+            
+            decoded = self.processor.batch_decode(output, skip_special_tokens=True, output_offsets=True)[0]
+            offset = start / SAMPLE_RATE
+            for piece in decoded["offsets"]:
+                piece_start, piece_end = piece["timestamp"]
+                if piece_end is None:
+                    piece_end = len(chunk) / SAMPLE_RATE
+                # Token-level timestamps need cross-attention outputs the OpenVINO export
+                # does not provide, so only segment timestamps are available here
+                result_segments.append({
+                    "start": piece_start + offset,
+                    "end": piece_end + offset,
+                    "text": piece["text"],
+                    "words": []
+                })
+        
+        result = {
+            "text": "".join(segment["text"] for segment in result_segments),
+            "language": detected_language,
+            "segments": result_segments
+        }
+        
+        if spans:
+            self._restore_timestamps(result, spans)
+        
+        return result
+
+    def transcribe_audio(self, audio: Union[str, np.ndarray], language: Optional[str] = None,
+                         fast: bool = False) -> Dict[str, Any]:
+        """
+        Transcribe audio using Whisper
+        
+        Args:
+            audio: Path to audio file or already decoded 16kHz mono float32 waveform
+            language: Language code (optional, auto-detect if None)
+            fast: Use the tiny model instead of the main model, if it is loaded
+            
         Returns:
             Transcription result with text and metadata
         """
@@ -128,37 +529,34 @@ class AudioTranscriber:
             if not self.model:
                 self._load_model()
             
-            if not os.path.exists(audio_path):
-                raise FileNotFoundError(f"Audio file not found: {audio_path}")
-            
-            logger.info(f"Starting transcription of {audio_path}")
-            
-            # Convert to WAV if needed
-            converted_path = None
-            if not audio_path.lower().endswith('.wav'):
-                converted_path = self.convert_audio_format(audio_path)
-                transcribe_path = converted_path
+            if isinstance(audio, str):
+                if not os.path.exists(audio):
+                    raise FileNotFoundError(f"Audio file not found: {audio}")
+                
+                logger.info(f"Starting transcription of {audio}")
+                
+                # Decode once to 16kHz mono PCM; every backend accepts the waveform directly
+                audio, _ = self._decode_to_array(audio)
             else:
-                transcribe_path = audio_path
+                logger.info(f"Starting transcription of {len(audio) / SAMPLE_RATE:.1f}s of audio")
             
-            # Transcribe
-            result = self.model.transcribe(
-                transcribe_path,
-                language=language,
-                verbose=False,
-                word_timestamps=True
-            )
+            model = self.fast_model if fast else None
             
-            # Clean up converted file
-            if converted_path and os.path.exists(converted_path):
-                os.unlink(converted_path)
+            with self._model_guard():
+                if self.backend == "faster-whisper":
+                    result = self._transcribe_faster_whisper(audio, language, model)
+                elif self.backend == "openvino":
+                    result = self._transcribe_openvino(audio, language)
+                else:
+                    result = self._transcribe_openai_whisper(audio, language, model)
             
             # Process result
             transcription_result = {
                 "text": result["text"].strip(),
                 "language": result["language"],
                 "segments": [],
-                "duration": 0
+                "duration": 0,
+                "model": FAST_MODEL_SIZE if model is not None else os.path.basename(self.model_size)
             }
             
             # Process segments with timestamps
@@ -194,81 +592,113 @@ class AudioTranscriber:
             logger.error(f"Transcription failed: {e}")
             raise
 
-    def transcribe_long_audio(self, audio_path: str, language: Optional[str] = None) -> Dict[str, Any]:
+    def _transcribe_segments(self, segments: List[np.ndarray], language: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Transcribe audio segments, in parallel when the backend supports it
+        
+        Args:
+            segments: Waveform segments
+            language: Language code (optional)
+            
+        Returns:
+            Transcription results in segment order
+        """
+        def transcribe_segment(indexed_segment):
+            i, segment = indexed_segment
+            logger.info(f"Transcribing segment {i+1}/{len(segments)}")
+            return self.transcribe_audio(segment, language)
+        
+        # The reference PyTorch and OpenVINO models are not safe to share across threads
+        max_workers = min(len(segments), self.num_workers) if self.backend == "faster-whisper" else 1
+        if max_workers <= 1:
+            return [transcribe_segment(indexed) for indexed in enumerate(segments)]
+        
+        logger.info(f"Transcribing {len(segments)} segments with {max_workers} workers")
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return list(executor.map(transcribe_segment, enumerate(segments)))
+
+    @cached(key=_transcription_cache_key)
+    def transcribe_long_audio(self, audio: Union[str, np.ndarray], language: Optional[str] = None,
+                              quality: str = "accurate", audio_digest: Optional[str] = None) -> Dict[str, Any]:
         """
         Transcribe long audio files by segmenting them
         
         Args:
-            audio_path: Path to audio file
+            audio: Path to audio file or already decoded 16kHz mono float32 waveform
             language: Language code (optional)
+            quality: 'fast' transcribes clips under a minute with the tiny model, 'accurate' never does
+            audio_digest: file_hash of the audio file if the caller already computed it (optional)
             
         Returns:
             Combined transcription result
         """
         try:
-            # Check audio duration
-            audio = AudioSegment.from_file(audio_path)
-            duration_minutes = len(audio) / (1000 * 60)
+            # Decode once; everything below works on the in-memory waveform
+            sample_rate = SAMPLE_RATE
+            if isinstance(audio, str):
+                audio, sample_rate = self._decode_to_array(audio)
+            duration_minutes = len(audio) / (sample_rate * 60)
             
             logger.info(f"Audio duration: {duration_minutes:.1f} minutes")
             
+            if quality == "fast" and self.fast_model is not None and duration_minutes * 60 < FAST_MAX_SECONDS:
+                logger.info(f"Transcribing short clip with {FAST_MODEL_SIZE} model")
+                return self.transcribe_audio(audio, language, fast=True)
+            
+            # Detect the language once with the tiny model so the main model skips its own pass
+            if language is None:
+                language = self.detect_language(audio)
+            
             if duration_minutes <= 30:  # Process directly if under 30 minutes
-                return self.transcribe_audio(audio_path, language)
+                return self.transcribe_audio(audio, language)
             
             # Segment and transcribe
-            segments = self.segment_long_audio(audio_path, max_duration_minutes=25)
+            segments = self.segment_long_audio(audio, max_duration_minutes=25)
             
             combined_result = {
                 "text": "",
                 "language": None,
                 "segments": [],
-                "duration": 0
+                "duration": 0,
+                "model": os.path.basename(self.model_size)
             }
             
+            segment_results = self._transcribe_segments(segments, language)
+            
             time_offset = 0
             
-            for i, segment_path in enumerate(segments):
-                logger.info(f"Transcribing segment {i+1}/{len(segments)}")
+            for segment, segment_result in zip(segments, segment_results):
+                # Set language from first segment
+                if combined_result["language"] is None:
+                    combined_result["language"] = segment_result["language"]
                 
-                try:
-                    segment_result = self.transcribe_audio(segment_path, language)
-                    
-                    # Set language from first segment
-                    if combined_result["language"] is None:
-                        combined_result["language"] = segment_result["language"]
-                    
-                    # Append text
-                    if combined_result["text"]:
-                        combined_result["text"] += " "
-                    combined_result["text"] += segment_result["text"]
+                # Append text
+                if combined_result["text"]:
+                    combined_result["text"] += " "
+                combined_result["text"] += segment_result["text"]
+                
+                # Adjust timestamps and append segments
+                for seg in segment_result["segments"]:
+                    adjusted_segment = {
+                        "start": seg["start"] + time_offset,
+                        "end": seg["end"] + time_offset,
+                        "text": seg["text"],
+                        "words": []
+                    }
                     
-                    # Adjust timestamps and append segments
-                    for seg in segment_result["segments"]:
-                        adjusted_segment = {
-                            "start": seg["start"] + time_offset,
-                            "end": seg["end"] + time_offset,
-                            "text": seg["text"],
-                            "words": []
+                    # Adjust word timestamps
+                    for word in seg.get("words", []):
+                        adjusted_word = {
+                            "word": word["word"],
+                            "start": word["start"] + time_offset,
+                            "end": word["end"] + time_offset
                         }
-                        
-                        # Adjust word timestamps
-                        for word in seg.get("words", []):
-                            adjusted_word = {
-                                "word": word["word"],
-                                "start": word["start"] + time_offset,
-                                "end": word["end"] + time_offset
-                            }
-                            adjusted_segment["words"].append(adjusted_word)
-                        
-                        combined_result["segments"].append(adjusted_segment)
+                        adjusted_segment["words"].append(adjusted_word)
                     
-                    # Update time offset
-                    time_offset += segment_result["duration"]
-                    
-                finally:
-                    # Clean up segment file
-                    if os.path.exists(segment_path):
-                        os.unlink(segment_path)
+                    combined_result["segments"].append(adjusted_segment)
+                
+                # Update time offset by the segment length, trailing silence included
+                time_offset += len(segment) / SAMPLE_RATE
             
             combined_result["duration"] = time_offset
             
@@ -291,14 +721,18 @@ class AudioTranscriber:
             Audio file metadata
         """
         try:
-            audio = AudioSegment.from_file(audio_path)
+            # ffprobe only reads container metadata instead of decoding the whole file
+            probe = ffmpeg.probe(audio_path)
+            stream = next(st for st in probe["streams"] if st.get("codec_type") == "audio")
+            duration_seconds = float(probe["format"].get("duration") or stream.get("duration") or 0)
+            bits_per_sample = int(stream.get("bits_per_raw_sample") or stream.get("bits_per_sample") or 0)
             
             return {
-                "duration_seconds": len(audio) / 1000,
-                "duration_minutes": len(audio) / (1000 * 60),
-                "channels": audio.channels,
-                "frame_rate": audio.frame_rate,
-                "sample_width": audio.sample_width,
+                "duration_seconds": duration_seconds,
+                "duration_minutes": duration_seconds / 60,
+                "channels": stream.get("channels"),
+                "frame_rate": int(stream.get("sample_rate", 0)),
+                "sample_width": bits_per_sample // 8 or None,
                 "format": os.path.splitext(audio_path)[1].lower(),
                 "file_size_mb": os.path.getsize(audio_path) / (1024 * 1024)
             }
@@ -323,6 +757,8 @@ class AudioTranscriber:
             return {
                 "status": "healthy",
                 "model": f"whisper-{self.model_size}",
+                "backend": self.backend,
+                "fast_model": f"whisper-{FAST_MODEL_SIZE}" if self.fast_model is not None else None,
                 "loaded": True,
                 "supported_formats": self.supported_formats
             }
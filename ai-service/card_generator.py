@@ -1,24 +1,41 @@
+import os
 import re
 import random
-from typing import List, Dict, Any
-from transformers import T5ForConditionalGeneration, T5Tokenizer
+from typing import List, Dict, Any, Optional
+from transformers import T5ForConditionalGeneration, T5TokenizerFast
+import numpy as np
 import torch
 
+# Let the int8 GEMM kernels use every core; inter-op parallelism buys nothing for generate()
+torch.set_num_threads(os.cpu_count() or 1)
+torch.set_num_interop_threads(1)
+
+# Compiled once at import instead of on every preprocess_text call
+_WS_RE = re.compile(r'\s+')
+_SENT_RE = re.compile(r'[.!?]+')
+
 class FlashcardGenerator:
     def __init__(self, model_name="t5-small"):
-        self.tokenizer = T5Tokenizer.from_pretrained(model_name)
+        # Rust-backed tokenizer, much faster than the SentencePiece Python one
+        self.tokenizer = T5TokenizerFast.from_pretrained(model_name)
         self.model = T5ForConditionalGeneration.from_pretrained(model_name)
+        # Dynamic int8 quantization of the Linear layers for faster CPU inference
+        self.model = torch.quantization.quantize_dynamic(self.model, {torch.nn.Linear}, dtype=torch.qint8)
+        self.model.eval()
+        
+        # The task prefixes never change, so tokenize them once
+        self._question_prefix_ids = self.tokenizer.encode("generate question:", add_special_tokens=False)
+        self._summarize_prefix_ids = self.tokenizer.encode("summarize:", add_special_tokens=False)
         
     def preprocess_text(self, text: str) -> List[str]:
         """
         Preprocess text into chunks suitable for flashcard generation.
         """
         # Clean the text
-        text = re.sub(r'\s+', ' ', text)  # Normalize whitespace
-        text = text.strip()
+        text = _WS_RE.sub(' ', text).strip()  # Normalize whitespace
         
         # Split into sentences
-        sentences = re.split(r'[.!?]+', text)
+        sentences = _SENT_RE.split(text)
         sentences = [s.strip() for s in sentences if s.strip() and len(s.strip()) > 20]
         
         # Group sentences into chunks of 2-3 sentences
@@ -30,62 +47,91 @@ class FlashcardGenerator:
         
         return chunks[:20]  # Limit to 20 chunks to avoid too many cards
     
-    def generate_qa_card(self, text: str) -> Dict[str, Any]:
+    def _generate_batch(self, prefix_ids: List[int], texts: List[str], max_length: int, temperature: float) -> List[str]:
         """
-        Generate a Q&A flashcard from text.
+        Run a single batched T5 generate call over the pre-tokenized prefix followed by each text.
         """
-        try:
-            # Generate question
-            question_prompt = f"generate question: {text}"
-            question_inputs = self.tokenizer.encode(question_prompt, return_tensors="pt", max_length=512, truncation=True)
-            question_outputs = self.model.generate(
-                question_inputs, 
-                max_length=100, 
+        # Only the variable text is tokenized per call; truncate it so prefix + text fits in 512 tokens
+        text_ids = self.tokenizer(texts, truncation=True, max_length=512 - len(prefix_ids))["input_ids"]
+        inputs = self.tokenizer.pad({"input_ids": [prefix_ids + ids for ids in text_ids]}, return_tensors="pt")
+        with torch.inference_mode():
+            outputs = self.model.generate(
+                **inputs,
+                max_length=max_length,
                 num_return_sequences=1,
-                temperature=0.7,
+                temperature=temperature,
                 do_sample=True,
                 pad_token_id=self.tokenizer.eos_token_id
             )
-            question = self.tokenizer.decode(question_outputs[0], skip_special_tokens=True)
-            
-            # Clean up the question
-            if question.startswith("question:"):
-                question = question[9:].strip()
-            if not question.endswith('?'):
-                question += '?'
-            
-            return {
-                "type": "qa",
-                "question": question.capitalize(),
-                "answer": text,
-                "source_text": text
-            }
-        except Exception as e:
-            return {
+        return self.tokenizer.batch_decode(outputs, skip_special_tokens=True)
+    
+    def _clean_question(self, question: str) -> str:
+        """
+        Strip the task prefix from a generated question and normalize punctuation.
+        """
+        if question.startswith("question:"):
+            question = question[9:].strip()
+        if not question.endswith('?'):
+            question += '?'
+        return question.capitalize()
+    
+    def _clean_definition(self, definition: str) -> str:
+        """
+        Strip the task prefix from a generated definition.
+        """
+        if definition.startswith("summarize:"):
+            definition = definition[10:].strip()
+        return definition
+    
+    def generate_qa_cards(self, texts: List[str]) -> List[Dict[str, Any]]:
+        """
+        Generate Q&A flashcards for several texts with one batched generate call.
+        """
+        try:
+            outputs = self._generate_batch(self._question_prefix_ids, texts, max_length=100, temperature=0.7)
+            questions = [self._clean_question(question) for question in outputs]
+        except Exception:
+            questions = ["What is the main concept described in this text?"] * len(texts)
+        
+        return [
+            {
                 "type": "qa",
-                "question": "What is the main concept described in this text?",
+                "question": question,
                 "answer": text,
                 "source_text": text
             }
+            for question, text in zip(questions, texts)
+        ]
+    
+    def generate_qa_card(self, text: str) -> Dict[str, Any]:
+        """
+        Generate a Q&A flashcard from text.
+        """
+        return self.generate_qa_cards([text])[0]
     
-    def generate_cloze_card(self, text: str) -> Dict[str, Any]:
+    def generate_cloze_card(self, text: str, words: Optional[List[str]] = None, pick: Optional[int] = None) -> Dict[str, Any]:
         """
         Generate a cloze deletion flashcard from text.
+        
+        `pick` is a pre-drawn random integer selecting the target word; one is drawn if omitted.
         """
         try:
             # Find key terms to create cloze deletions
-            words = text.split()
+            if words is None:
+                words = text.split()
             if len(words) < 5:
                 return None
             
-            # Select important words (nouns, longer words)
-            important_words = [w for w in words if len(w) > 4 and w.isalpha()]
-            if not important_words:
-                important_words = [w for w in words if len(w) > 3 and w.isalpha()]
+            # Select important words (nouns, longer words), in a single pass over the chunk
+            candidate_words = [w for w in words if len(w) > 3 and w.isalpha()]
+            important_words = [w for w in candidate_words if len(w) > 4] or candidate_words
             
             if important_words:
                 # Select a random important word
-                target_word = random.choice(important_words)
+                if pick is None:
+                    target_word = random.choice(important_words)
+                else:
+                    target_word = important_words[pick % len(important_words)]
                 cloze_text = text.replace(target_word, "______", 1)
                 
                 return {
@@ -99,45 +145,37 @@ class FlashcardGenerator:
         
         return None
     
-    def generate_definition_card(self, text: str) -> Dict[str, Any]:
+    def generate_definition_cards(self, texts: List[str]) -> List[Dict[str, Any]]:
         """
-        Generate a definition-style flashcard.
+        Generate definition-style flashcards for several texts with one batched generate call.
         """
         try:
-            # Generate a summary/definition
-            definition_prompt = f"summarize: {text}"
-            definition_inputs = self.tokenizer.encode(definition_prompt, return_tensors="pt", max_length=512, truncation=True)
-            definition_outputs = self.model.generate(
-                definition_inputs,
-                max_length=80,
-                num_return_sequences=1,
-                temperature=0.5,
-                do_sample=True,
-                pad_token_id=self.tokenizer.eos_token_id
-            )
-            definition = self.tokenizer.decode(definition_outputs[0], skip_special_tokens=True)
-            
-            # Clean up the definition
-            if definition.startswith("summarize:"):
-                definition = definition[10:].strip()
-            
-            return {
-                "type": "definition",
-                "question": f"Define or explain: {definition}",
-                "answer": text,
-                "source_text": text
-            }
-        except Exception as e:
-            return {
+            outputs = self._generate_batch(self._summarize_prefix_ids, texts, max_length=80, temperature=0.5)
+            questions = [f"Define or explain: {self._clean_definition(definition)}" for definition in outputs]
+        except Exception:
+            questions = ["Explain the concept described in this text:"] * len(texts)
+        
+        return [
+            {
                 "type": "definition",
-                "question": "Explain the concept described in this text:",
+                "question": question,
                 "answer": text,
                 "source_text": text
             }
+            for question, text in zip(questions, texts)
+        ]
     
-    def generate_flashcards(self, text: str) -> List[Dict[str, Any]]:
+    def generate_definition_card(self, text: str) -> Dict[str, Any]:
+        """
+        Generate a definition-style flashcard.
+        """
+        return self.generate_definition_cards([text])[0]
+    
+    def generate_flashcards(self, text: str, seed: Optional[int] = None) -> List[Dict[str, Any]]:
         """
         Generate multiple types of flashcards from input text.
+        
+        Card type selection is drawn from `seed` when given, which makes it reproducible.
         """
         if not text or len(text.strip()) < 10:
             return []
@@ -148,24 +186,41 @@ class FlashcardGenerator:
         if not chunks:
             return []
         
+        # Split each chunk into words once and reuse the result for every card type
+        chunk_words = [chunk.split() for chunk in chunks]
+        
+        # Draw all random numbers for the request at once
+        rng = np.random.default_rng(seed)
+        probs = rng.random((len(chunks), 2))
+        cloze_picks = rng.integers(0, 1 << 30, size=len(chunks))
+        
+        # Decide the extra card types per chunk up front so the model calls can be batched
+        with_cloze = []
+        with_definition = []
+        for i, words in enumerate(chunk_words):
+            num_words = len(words)
+            with_cloze.append(num_words > 10 and probs[i, 0] < 0.3)
+            with_definition.append(num_words > 15 and probs[i, 1] < 0.2)
+        
+        # One generate call for all questions and one for all definitions
+        qa_cards = self.generate_qa_cards(chunks)
+        definition_chunks = [chunk for chunk, selected in zip(chunks, with_definition) if selected]
+        definition_cards = iter(self.generate_definition_cards(definition_chunks) if definition_chunks else [])
+        
         flashcards = []
         
-        for chunk in chunks:
-            # Generate Q&A card (primary type)
-            qa_card = self.generate_qa_card(chunk)
-            if qa_card:
-                flashcards.append(qa_card)
+        for i, chunk in enumerate(chunks):
+            # Q&A card (primary type)
+            flashcards.append(qa_cards[i])
             
-            # Occasionally generate other types
-            if len(chunk.split()) > 10 and random.random() < 0.3:
-                cloze_card = self.generate_cloze_card(chunk)
+            # Occasionally other types
+            if with_cloze[i]:
+                cloze_card = self.generate_cloze_card(chunk, chunk_words[i], int(cloze_picks[i]))
                 if cloze_card:
                     flashcards.append(cloze_card)
             
-            if len(chunk.split()) > 15 and random.random() < 0.2:
-                def_card = self.generate_definition_card(chunk)
-                if def_card:
-                    flashcards.append(def_card)
+            if with_definition[i]:
+                flashcards.append(next(definition_cards))
         
         # Limit total cards and add metadata
         flashcards = flashcards[:15]  # Max 15 cards per document
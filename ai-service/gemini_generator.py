@@ -1,37 +1,294 @@
 import os
 import json
+import asyncio
+import threading
 import re
+import functools
 import logging
-from typing import List, Dict, Any, Optional
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, AsyncIterator, Awaitable, Callable, Iterator, Optional, Tuple, TypeVar
+import diskcache
+from datasketch import MinHash, MinHashLSH
+from aiolimiter import AsyncLimiter
+import fastjsonschema
+import orjson
 import google.generativeai as genai
 from dotenv import load_dotenv
+from result_cache import CACHE_DIR, content_key
+from semantic_cache import SemanticCache
 
 # Load environment variables
 load_dotenv()
 
 logger = logging.getLogger(__name__)
 
+GEMINI_MODEL_NAME = 'gemini-1.5-pro-latest'
+
+RESPONSE_CACHE_EXPIRE_SECONDS = 7 * 24 * 60 * 60  # 1 week
+RESPONSE_CACHE_SIZE_LIMIT = 2 << 30  # 2GB, least recently used entries are evicted first
+
+CHUNK_TARGET_CHARS = 12000  # Longer inputs are split into chunks generated in parallel
+MAX_CHUNKS = 16
+MIN_UNIQUE_WORDS_PER_CARD = 15
+OUTPUT_TOKENS_PER_CARD = 150  # Budget for one card's JSON, sets max_output_tokens per request
+OUTPUT_TOKENS_HEADROOM = 256  # Slack for the JSON wrapper and longer than average cards
+DUPLICATE_CARD_THRESHOLD = 0.8  # Cards whose estimated Jaccard similarity reaches this are duplicates
+MINHASH_PERMUTATIONS = 64
+
+_BAD_CHARS_RE = re.compile(r'[^\w\s\.\,\?\!\:\;\(\)\-\'\"]')
+_SENTENCE_RE = re.compile(r'[^.]+')
+
+FLASHCARD_RESPONSE_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'flashcards': {
+            'type': 'array',
+            'items': {
+                'type': 'object',
+                'properties': {
+                    'type': {'type': 'string', 'format': 'enum', 'enum': ['qa', 'cloze', 'definition']},
+                    'question': {'type': 'string'},
+                    'answer': {'type': 'string', 'description': 'Accurate, concise answer'},
+                    'difficulty': {'type': 'string', 'format': 'enum', 'enum': ['easy', 'medium', 'hard']},
+                },
+                'required': ['type', 'question', 'answer', 'difficulty'],
+            },
+        },
+    },
+    'required': ['flashcards'],
+}
+
+FLASHCARD_VALIDATION_SCHEMA = {
+    'type': 'object',
+    'required': ['type', 'question', 'answer'],
+    'properties': {
+        'type': {'enum': ['qa', 'cloze', 'definition']},
+        'question': {'type': 'string', 'pattern': r'\S'},  # Not blank
+        'answer': {'type': 'string', 'pattern': r'\S'},
+        'difficulty': {'enum': ['easy', 'medium', 'hard']},
+    },
+}
+
+T = TypeVar('T')
+
+_event_loop: Optional[asyncio.AbstractEventLoop] = None
+_event_loop_lock = threading.Lock()
+
+def _get_event_loop() -> asyncio.AbstractEventLoop:
+    """
+    Return the background event loop all async Gemini calls run on, starting it on first use.
+    The SDK's async gRPC client binds to the loop it was first used from, so every request
+    thread shares this one loop instead of spinning up its own with asyncio.run.
+    """
+    global _event_loop
+    with _event_loop_lock:
+        if _event_loop is None:
+            _event_loop = asyncio.new_event_loop()
+            threading.Thread(target=_event_loop.run_forever, name='gemini-event-loop', daemon=True).start()
+    return _event_loop
+
+def _run_coroutine(coro: Awaitable[T]) -> T:
+    """Run a coroutine on the shared event loop and block until it finishes"""
+    return asyncio.run_coroutine_threadsafe(coro, _get_event_loop()).result()
+
+_configured_api_key: Optional[str] = None
+_configure_lock = threading.Lock()
+
+def _configure_client(api_key: str):
+    """
+    Configure the genai client for an API key once per process. genai.configure discards the
+    SDK's cached gRPC clients, so calling it for every generator would drop warm connections.
+    """
+    global _configured_api_key
+    with _configure_lock:
+        if _configured_api_key != api_key:
+            genai.configure(api_key=api_key)
+            _configured_api_key = api_key
+
+@functools.lru_cache(maxsize=8)
+def _get_model(name: str) -> genai.GenerativeModel:
+    """Return the process-wide GenerativeModel for a model name, shared by every generator"""
+    return genai.GenerativeModel(name)
+
+def _card_minhash(card: Dict[str, Any]) -> MinHash:
+    """MinHash signature of a card's question and answer over character 3-grams"""
+    text = f"{card['question']} {card['answer']}".lower()
+    signature = MinHash(num_perm=MINHASH_PERMUTATIONS)
+    signature.update_batch({text[i:i + 3].encode('utf-8') for i in range(max(1, len(text) - 2))})
+    return signature
+
+class _FlashcardStreamParser:
+    """
+    Incrementally extract card objects from a streamed {"flashcards": [...]} response
+    by tracking brace depth outside of JSON strings
+    """
+    def __init__(self):
+        self.parts: List[str] = []
+        self.depth = 0
+        self.in_string = False
+        self.escape = False
+        self.card_parts: Optional[List[str]] = None  # Text of the card object currently open
+        self.card_length = 0
+        self.last_comma = None  # Offset of the last top-level comma in the open card
+        self.count = 0
+
+    @property
+    def text(self) -> str:
+        """The response received so far, joined on demand"""
+        return ''.join(self.parts)
+
+    def _parse(self, raw: str) -> Optional[Dict[str, Any]]:
+        try:
+            card = orjson.loads(raw)
+        except orjson.JSONDecodeError as e:
+            logger.warning(f"Failed to parse streamed flashcard: {e}")
+            return None
+        return card if isinstance(card, dict) else None
+
+    def feed(self, text: str) -> List[Tuple[int, Dict[str, Any]]]:
+        """
+        Consume a chunk of response text
+        
+        Returns:
+            (index, card) pairs for every card object completed by this chunk
+        """
+        self.parts.append(text)
+        cards = []
+        # Start of the open card within this chunk
+        start = 0 if self.card_parts is not None else None
+        for i, ch in enumerate(text):
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif ch == '\\':
+                    self.escape = True
+                elif ch == '"':
+                    self.in_string = False
+            elif ch == '"':
+                self.in_string = True
+            elif ch == '{':
+                self.depth += 1
+                if self.depth == 2:
+                    self.card_parts = []
+                    self.card_length = 0
+                    self.last_comma = None
+                    start = i
+            elif ch == '}':
+                if self.depth == 2 and self.card_parts is not None:
+                    self.card_parts.append(text[start:i + 1])
+                    card = self._parse(''.join(self.card_parts))
+                    if card is not None:
+                        cards.append((self.count, card))
+                    self.count += 1
+                    self.card_parts = None
+                    start = None
+                self.depth -= 1
+            elif ch == ',' and self.depth == 2 and self.card_parts is not None:
+                self.last_comma = self.card_length + i - start
+        if self.card_parts is not None:
+            self.card_parts.append(text[start:])
+            self.card_length += len(text) - start
+        return cards
+
+    def finish(self) -> List[Tuple[int, Dict[str, Any]]]:
+        """
+        Close a card left open by a truncated response, keeping only its complete fields
+        
+        Returns:
+            The recovered (index, card) pair, if any
+        """
+        if self.card_parts is None:
+            return []
+
+        raw = ''.join(self.card_parts)
+        candidates = []
+        if not self.in_string:
+            candidates.append(raw.rstrip().rstrip(',') + '}')
+        if self.last_comma is not None:
+            candidates.append(raw[:self.last_comma] + '}')
+
+        for candidate in candidates:
+            try:
+                card = orjson.loads(candidate)
+            except orjson.JSONDecodeError:
+                continue
+            if isinstance(card, dict):
+                logger.warning("Recovered truncated flashcard from incomplete response")
+                self.card_parts = None
+                return [(self.count, card)]
+        return []
+
+class InsufficientContentError(ValueError):
+    """Raised when a text has too little distinct content for even one flashcard"""
+
 class GeminiFlashcardGenerator:
-    def __init__(self, api_key: Optional[str] = None):
+    def __init__(self, api_key: Optional[str] = None, rpm: Optional[int] = None, tpm: Optional[int] = None):
         """
         Initialize Gemini flashcard generator
+        
+        Args:
+            api_key: Google API key (optional, GOOGLE_API_KEY otherwise)
+            rpm: Requests per minute allowed by the project quota (optional, GEMINI_RPM otherwise)
+            tpm: Tokens per minute allowed by the project quota (optional, GEMINI_TPM otherwise)
         """
         self.api_key = api_key or os.getenv('GOOGLE_API_KEY')
         if not self.api_key:
             raise ValueError("Google API key is required. Set GOOGLE_API_KEY environment variable.")
         
+        # Pace requests to the quota instead of hitting 429s and backing off
+        self.rpm = rpm or int(os.getenv('GEMINI_RPM', '60'))
+        self.tpm = tpm or int(os.getenv('GEMINI_TPM', '1000000'))
+        self._rpm_limiter = AsyncLimiter(max_rate=self.rpm, time_period=60)
+        self._tpm_limiter = AsyncLimiter(max_rate=max(1, self.tpm // 1000), time_period=60)  # In units of 1K tokens
+        
+        # Requests answered without Gemini ("direct") vs. generated by it ("render")
+        self.metrics = Counter(direct=0, render=0)
+        
+        # Blocking work off the event loop, sized to the requests the quota lets run at once
+        self._executor = ThreadPoolExecutor(max_workers=self.rpm // 60 + 4, thread_name_prefix='gemini-blocking')
+        
         # Configure Gemini
-        genai.configure(api_key=self.api_key)
-        self.model = genai.GenerativeModel('gemini-1.5-pro-latest')
+        _configure_client(self.api_key)
+        self.model = _get_model(GEMINI_MODEL_NAME)
         
         # Configuration
         self.generation_config = {
             'temperature': 0.7,
             'top_p': 0.8,
             'top_k': 40,
-            'max_output_tokens': 4096,
+            # Constrained decoding guarantees a bare JSON body in the expected shape
+            'response_mime_type': 'application/json',
+            'response_schema': FLASHCARD_RESPONSE_SCHEMA,
         }
         
+        # Static prompt scaffold, built once; the card structure is enforced by response_schema
+        self._prompt_head = (
+            "You are an expert educational content creator specializing in creating effective "
+            "flashcards for spaced repetition learning.\n\n"
+            "CONTENT:\n"
+        )
+        self._prompt_tail_tmpl = (
+            "\n\nGenerate exactly {n} flashcards from the content above, mixing "
+            "qa (60%), cloze (25%) and definition (15%) cards. "
+            "Focus on the most important concepts, facts and relationships, "
+            "test understanding rather than memorization, vary difficulty, and keep answers concise but complete. "
+            'Cloze cards replace key terms with "______"; definition cards ask "What is [term]?".'
+        )
+        
+        # Card validator, compiled once into specialized Python code
+        self._validate = fastjsonschema.compile(FLASHCARD_VALIDATION_SCHEMA)
+        
+        # Exact-match cache of validated Gemini responses
+        self.cache = diskcache.Cache(
+            os.path.join(CACHE_DIR, 'gemini'),
+            size_limit=RESPONSE_CACHE_SIZE_LIMIT,
+            eviction_policy='least-recently-used'
+        )
+        
+        # Embedding-similarity cache for lightly edited re-uploads
+        self.semantic_cache = SemanticCache()
+        
         self.safety_settings = [
             {
                 "category": "HARM_CATEGORY_HARASSMENT",
@@ -56,19 +313,22 @@ class GeminiFlashcardGenerator:
         Clean and preprocess text for better flashcard generation
         """
         # Remove excessive whitespace
-        text = re.sub(r'\s+', ' ', text)
+        text = ' '.join(text.split())
         
         # Remove special characters that might confuse the model
-        text = re.sub(r'[^\w\s\.\,\?\!\:\;\(\)\-\'\"]', ' ', text)
+        text = _BAD_CHARS_RE.sub(' ', text)
         
-        # Limit text length for optimal processing (Gemini can handle large context but let's be efficient)
-        max_chars = 100000  # ~25,000 words
-        if len(text) > max_chars:
-            # Try to cut at sentence boundary
-            text = text[:max_chars]
-            last_period = text.rfind('.')
-            if last_period > max_chars * 0.8:  # If we find a period in the last 20%
-                text = text[:last_period + 1]
+        # Limit text length; anything over CHUNK_TARGET_CHARS is split into parallel requests
+        max_bytes = 400000  # ~100,000 words
+        data = text.encode('utf-8')
+        if len(data) > max_bytes:
+            # Try to cut at sentence boundary, decoding only the retained prefix
+            prefix = data[:max_bytes]
+            last_period = prefix.rfind(b'.', int(max_bytes * 0.8))  # Only look in the last 20%
+            if last_period != -1:
+                prefix = prefix[:last_period + 1]
+            # A multi-byte character split by the cut is dropped
+            text = prefix.decode('utf-8', errors='ignore')
         
         return text.strip()
 
@@ -76,149 +336,314 @@ class GeminiFlashcardGenerator:
         """
         Create an optimized prompt for Gemini to generate flashcards
         """
-        prompt = f"""
-You are an expert educational content creator specializing in creating effective flashcards for spaced repetition learning.
-
-Analyze the following educational content and generate exactly {num_cards} high-quality flashcards.
-
-CONTENT:
-{text}
-
-REQUIREMENTS:
-1. Generate exactly {num_cards} flashcards
-2. Mix different card types:
-   - 60% Q&A cards (question → answer)
-   - 25% Cloze deletion cards (fill in the blank)
-   - 15% Definition cards (term → definition)
-3. Focus on the most important concepts, facts, and relationships
-4. Questions should test understanding, not just memorization
-5. Vary difficulty levels (easy, medium, hard)
-6. Ensure answers are concise but complete
-7. For cloze cards, replace key terms with "______"
-
-OUTPUT FORMAT:
-Return ONLY a valid JSON object with this exact structure:
-
-{{
-  "flashcards": [
-    {{
-      "type": "qa",
-      "question": "Clear, specific question",
-      "answer": "Accurate, concise answer",
-      "difficulty": "easy|medium|hard",
-      "source_text": "Original text segment this card is based on"
-    }},
-    {{
-      "type": "cloze",
-      "question": "Text with ______ blanks for key terms",
-      "answer": "The missing word or phrase",
-      "difficulty": "easy|medium|hard",
-      "source_text": "Original text segment this card is based on"
-    }},
-    {{
-      "type": "definition",
-      "question": "What is [term]?",
-      "answer": "Clear definition of the term",
-      "difficulty": "easy|medium|hard",
-      "source_text": "Original text segment this card is based on"
-    }}
-  ]
-}}
-
-IMPORTANT: Return ONLY the JSON object, no additional text or formatting.
-"""
-        return prompt
+        return self._prompt_head + text + self._prompt_tail_tmpl.format(n=num_cards)
+
+    def _cache_key(self, cleaned_text: str, num_cards: int) -> str:
+        """
+        Key a Gemini response on everything that determines it
+        """
+        config = json.dumps(self.generation_config, sort_keys=True)
+        return content_key(self.model.model_name, config, self._prompt_head, self._prompt_tail_tmpl,
+                           num_cards, cleaned_text)
 
     def generate_flashcards(self, text: str, num_cards: int = 10) -> List[Dict[str, Any]]:
         """
         Generate flashcards using Gemini Pro 1.5
         """
+        return _run_coroutine(self.generate_flashcards_async(text, num_cards))
+
+    async def generate_flashcards_async(self, text: str, num_cards: int = 10) -> List[Dict[str, Any]]:
+        """
+        Generate flashcards using Gemini Pro 1.5 without blocking the event loop
+        """
+        return [card async for card in self.aiter_flashcards(text, num_cards)]
+
+    async def agenerate(self, text: str, num_cards: int = 10) -> List[Dict[str, Any]]:
+        """
+        Await flashcard generation from any event loop, e.g. an async web handler.
+        The work is handed to the shared Gemini loop, so the caller's loop never blocks
+        and never touches the SDK's loop-bound async client.
+        """
+        future = asyncio.run_coroutine_threadsafe(self.generate_flashcards_async(text, num_cards), _get_event_loop())
+        return await asyncio.wrap_future(future)
+
+    async def _run_blocking(self, func: Callable[..., T], *args: Any) -> T:
+        """Run blocking work (cache I/O, embeddings, text cleanup) in the bounded executor"""
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    def generate_flashcards_batch(self, requests: List[Tuple[str, int]]) -> List[List[Dict[str, Any]]]:
+        """
+        Generate flashcards for several texts with their Gemini calls in flight concurrently
+        
+        Args:
+            requests: (text, num_cards) pairs
+            
+        Returns:
+            One list of flashcards per request, in order
+        """
+        async def gather():
+            return await asyncio.gather(
+                *[self.generate_flashcards_async(text, num_cards) for text, num_cards in requests]
+            )
+        return _run_coroutine(gather())
+
+    def iter_flashcards(self, text: str, num_cards: int = 10) -> Iterator[Dict[str, Any]]:
+        """
+        Stream flashcards from Gemini Pro 1.5, yielding each card as soon as it is complete
+        
+        Args:
+            text: Input text
+            num_cards: Number of cards to request
+            
+        Yields:
+            Validated flashcard dictionaries
+        """
+        cards = self.aiter_flashcards(text, num_cards)
+        try:
+            while True:
+                try:
+                    yield _run_coroutine(cards.__anext__())
+                except StopAsyncIteration:
+                    return
+        finally:
+            _run_coroutine(cards.aclose())
+
+    async def aiter_flashcards(self, text: str, num_cards: int = 10) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Async counterpart of iter_flashcards
+        """
+        validated_cards = []
+        cleaned_text = text
+        # A non-positive count would make the output token budget negative
+        num_cards = max(1, num_cards)
         try:
             logger.info(f"Starting flashcard generation for text of length {len(text)}")
             
             # Preprocess text
-            cleaned_text = self.preprocess_text(text)
+            cleaned_text = await self._run_blocking(self.preprocess_text, text)
             
             if len(cleaned_text.strip()) < 50:
                 logger.warning("Text too short for meaningful flashcard generation")
-                return []
+                return
             
-            # Create prompt
-            prompt = self.create_flashcard_prompt(cleaned_text, num_cards)
+            # Asking for more cards than the distinct content supports makes the model invent facts,
+            # so thin texts get fewer cards and only texts too thin for a single card are rejected
+            unique_words = len(set(cleaned_text.lower().split()))
+            supported_cards = unique_words // MIN_UNIQUE_WORDS_PER_CARD
+            if supported_cards < 1:
+                self.metrics['direct'] += 1
+                raise InsufficientContentError(
+                    f"Text has only {unique_words} distinct words, not enough for a flashcard. "
+                    f"Provide more content."
+                )
+            if supported_cards < num_cards:
+                logger.info(f"Reducing requested flashcards from {num_cards} to {supported_cards} "
+                            f"for text with {unique_words} distinct words")
+                num_cards = supported_cards
             
-            # Generate content
-            logger.info("Sending request to Gemini Pro 1.5")
-            response = self.model.generate_content(
-                prompt,
-                generation_config=self.generation_config,
-                safety_settings=self.safety_settings
-            )
+            # Identical requests skip the Gemini round-trip entirely
+            cache_key = self._cache_key(cleaned_text, num_cards)
+            try:
+                cached_cards = await self._run_blocking(self.cache.get, cache_key)
+            except Exception as e:
+                logger.warning(f"Flashcard cache lookup failed: {e}")
+                cached_cards = None
+            # Embedded once here and reused when the generated deck is added below
+            text_vec = None
+            if cached_cards is None:
+                text_vec = await self._run_blocking(self.semantic_cache.embed, cleaned_text)
+                cached_cards = await self._run_blocking(
+                    self.semantic_cache.lookup, cleaned_text, num_cards, text_vec
+                )
+            if cached_cards is not None:
+                self.metrics['direct'] += 1
+                logger.info(f"Returning {len(cached_cards)} cached flashcards")
+                for card in cached_cards:
+                    yield card
+                return
             
-            if not response.text:
-                logger.error("Empty response from Gemini")
-                return []
+            self.metrics['render'] += 1
+            # One entry per Gemini request, True if its response ended normally
+            completed = []
+            num_chunks = min(-(-len(cleaned_text) // CHUNK_TARGET_CHARS), MAX_CHUNKS, num_cards)
+            if num_chunks <= 1:
+                # Single request, cards are yielded as they stream in
+                cards = self._stream_chunk(cleaned_text, num_cards, completed)
+            else:
+                cards = self._generate_chunked(cleaned_text, num_cards, num_chunks, completed)
             
-            logger.info("Received response from Gemini, parsing JSON")
+            async for card in cards:
+                # Add metadata
+                card['id'] = f"card_{len(validated_cards)+1}"
+                card['created_at'] = "server_timestamp"
+                validated_cards.append(card)
+                yield card
             
-            # Parse JSON response
-            try:
-                # Clean the response text
-                response_text = response.text.strip()
-                
-                # Remove markdown formatting if present
-                if response_text.startswith('```json'):
-                    response_text = response_text[7:]
-                if response_text.endswith('```'):
-                    response_text = response_text[:-3]
-                
-                # Parse JSON
-                flashcard_data = json.loads(response_text)
-                
-                if 'flashcards' not in flashcard_data:
-                    logger.error("Invalid response format: missing 'flashcards' key")
-                    return []
-                
-                flashcards = flashcard_data['flashcards']
-                
-                # Validate and enhance flashcards
-                validated_cards = []
-                for i, card in enumerate(flashcards):
-                    if self.validate_flashcard(card):
-                        # Add metadata
-                        card['id'] = f"card_{i+1}"
-                        card['created_at'] = "server_timestamp"
-                        validated_cards.append(card)
-                    else:
-                        logger.warning(f"Skipping invalid flashcard: {card}")
-                
-                logger.info(f"Successfully generated {len(validated_cards)} valid flashcards")
-                return validated_cards
-                
-            except json.JSONDecodeError as e:
-                logger.error(f"Failed to parse JSON response: {e}")
-                logger.error(f"Response text: {response.text[:500]}...")
-                return self.fallback_flashcard_generation(cleaned_text, num_cards)
+            # A deck cut short by the token limit or a failed chunk is served but not cached
+            complete = len(validated_cards) >= num_cards or (bool(completed) and all(completed))
+            if validated_cards and not complete:
+                logger.warning(f"Not caching incomplete deck of {len(validated_cards)}/{num_cards} flashcards")
+            elif validated_cards:
+                try:
+                    await self._run_blocking(
+                        functools.partial(self.cache.set, expire=RESPONSE_CACHE_EXPIRE_SECONDS),
+                        cache_key, validated_cards
+                    )
+                except Exception as e:
+                    logger.warning(f"Failed to cache flashcards: {e}")
+                await self._run_blocking(
+                    self.semantic_cache.add, cleaned_text, num_cards, validated_cards, text_vec
+                )
+            
+            logger.info(f"Successfully generated {len(validated_cards)} valid flashcards")
+            
+            if not validated_cards:
+                logger.error("No valid flashcards found in Gemini response")
+                for card in self.fallback_flashcard_generation(cleaned_text, num_cards):
+                    yield card
                 
+        except InsufficientContentError:
+            raise
         except Exception as e:
             logger.error(f"Error generating flashcards with Gemini: {e}")
-            return self.fallback_flashcard_generation(text, num_cards)
+            # Cards already streamed to the caller are kept; only an empty result falls back
+            if not validated_cards:
+                for card in self.fallback_flashcard_generation(cleaned_text, num_cards):
+                    yield card
 
-    def validate_flashcard(self, card: Dict[str, Any]) -> bool:
+    async def _stream_chunk(self, text: str, num_cards: int, completed: List[bool]) -> AsyncIterator[Dict[str, Any]]:
         """
-        Validate a flashcard has required fields
+        Run one streaming Gemini request and yield its valid cards as each object closes
+        
+        Args:
+            text: Text to generate cards from
+            num_cards: Number of cards to request
+            completed: Receives True if the response ended normally, False if it was cut short
         """
-        required_fields = ['type', 'question', 'answer']
+        # Create prompt
+        prompt = self.create_flashcard_prompt(text, num_cards)
         
-        if not all(field in card for field in required_fields):
-            return False
+        max_output_tokens = num_cards * OUTPUT_TOKENS_PER_CARD + OUTPUT_TOKENS_HEADROOM
         
-        if not all(isinstance(card[field], str) and card[field].strip() for field in required_fields):
-            return False
+        # Roughly 4 characters per input token, plus the full output budget
+        kilotokens = -(-(len(prompt) // 4 + max_output_tokens) // 1000)
+        await self._tpm_limiter.acquire(min(kilotokens, self._tpm_limiter.max_rate))
         
-        if card['type'] not in ['qa', 'cloze', 'definition']:
-            return False
+        # Generate content
+        logger.info("Sending streaming request to Gemini Pro 1.5")
+        async with self._rpm_limiter:
+            stream = await self.model.generate_content_async(
+                prompt,
+                # Output length scales with the number of cards requested
+                generation_config=dict(self.generation_config, max_output_tokens=max_output_tokens),
+                safety_settings=self.safety_settings,
+                stream=True
+            )
+        
+        parser = _FlashcardStreamParser()
+        finish_reason = None
+        async for chunk in stream:
+            if chunk.candidates:
+                finish_reason = chunk.candidates[0].finish_reason
+            # The final chunk may carry only the finish reason
+            if not chunk.parts:
+                continue
+            for _, card in parser.feed(chunk.text):
+                if self.validate_flashcard(card):
+                    yield card
+                else:
+                    logger.warning(f"Skipping invalid flashcard: {card}")
+        
+        if not any(part.strip() for part in parser.parts):
+            logger.error("Empty response from Gemini")
+            completed.append(False)
+            return
+        
+        completed.append(finish_reason == genai.protos.Candidate.FinishReason.STOP and parser.card_parts is None)
+        
+        # Recover the last card if the response was cut off mid-object
+        for _, card in parser.finish():
+            if self.validate_flashcard(card):
+                yield card
+        
+        if parser.count == 0:
+            logger.error(f"Response text: {parser.text[:500]}...")
+
+    async def _generate_chunked(self, text: str, num_cards: int, num_chunks: int,
+                                completed: List[bool]) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Generate cards for a long text as parallel requests over its chunks,
+        then merge them in document order without near-duplicate questions
+        """
+        chunks = self._split(text, num_chunks)
+        # Split the cards exactly, so every chunk is asked for (and keeps) its own share
+        base, extra = divmod(num_cards, len(chunks))
+        chunk_cards = [base + (i < extra) for i in range(len(chunks))]
+        logger.info(f"Generating {chunk_cards} cards for {len(chunks)} chunks in parallel")
+        
+        async def collect(chunk: str, count: int) -> List[Dict[str, Any]]:
+            cards = [card async for card in self._stream_chunk(chunk, count, completed)]
+            return cards[:count]
+        
+        results = await asyncio.gather(
+            *[collect(chunk, count) for chunk, count in zip(chunks, chunk_cards)],
+            return_exceptions=True
+        )
         
-        return True
+        # Near-duplicate lookup stays linear in the number of cards
+        lsh = MinHashLSH(threshold=DUPLICATE_CARD_THRESHOLD, num_perm=MINHASH_PERMUTATIONS)
+        kept = 0
+        for i, result in enumerate(results):
+            if isinstance(result, Exception):
+                logger.warning(f"Flashcard generation failed for chunk {i+1}/{len(chunks)}: {result}")
+                completed.append(False)
+                continue
+            for card in result:
+                signature = _card_minhash(card)
+                if lsh.query(signature):
+                    continue
+                lsh.insert(str(kept), signature)
+                kept += 1
+                yield card
+
+    def _split(self, text: str, num_chunks: int) -> List[str]:
+        """
+        Split text into at most num_chunks chunks of similar length, cutting at sentence boundaries
+        """
+        target = -(-len(text) // num_chunks)
+        slack = int(target * 0.2)
+        chunks = []
+        start = 0
+        for i in range(1, num_chunks):
+            ideal = i * len(text) // num_chunks
+            # Cut at the sentence end nearest the even split point, then the nearest word break
+            cut = self._nearest(text, '.', ideal, max(start, ideal - slack), ideal + slack)
+            if cut == -1:
+                cut = self._nearest(text, ' ', ideal, max(start, ideal - slack), ideal + slack)
+            if cut <= start:
+                cut = ideal
+            chunks.append(text[start:cut + 1].strip())
+            start = cut + 1
+        chunks.append(text[start:].strip())
+        return [chunk for chunk in chunks if chunk]
+
+    def _nearest(self, text: str, char: str, position: int, lo: int, hi: int) -> int:
+        """Index of the occurrence of char in text[lo:hi] closest to position, or -1"""
+        before = text.rfind(char, lo, position)
+        after = text.find(char, position, hi)
+        if before == -1 or after == -1:
+            return max(before, after)
+        return before if position - before <= after - position else after
+
+    def validate_flashcard(self, card: Dict[str, Any]) -> bool:
+        """
+        Validate a flashcard has required fields
+        """
+        try:
+            self._validate(card)
+            return True
+        except fastjsonschema.JsonSchemaException:
+            return False
 
     def fallback_flashcard_generation(self, text: str, num_cards: int) -> List[Dict[str, Any]]:
         """
@@ -226,14 +651,12 @@ IMPORTANT: Return ONLY the JSON object, no additional text or formatting.
         """
         logger.info("Using fallback flashcard generation")
         
-        # Simple sentence-based card generation
-        sentences = [s.strip() for s in text.split('.') if len(s.strip()) > 20]
-        
-        if not sentences:
-            return []
+        # Simple sentence-based card generation, scanning only as far as num_cards sentences
+        sentences = (m.group(0).strip() for m in _SENTENCE_RE.finditer(text))
+        sentences = (sentence for sentence in sentences if len(sentence) > 20)
         
         flashcards = []
-        for i, sentence in enumerate(sentences[:num_cards]):
+        for i, sentence in zip(range(num_cards), sentences):
             # Create a simple Q&A card
             words = sentence.split()
             if len(words) > 5:
@@ -264,17 +687,19 @@ IMPORTANT: Return ONLY the JSON object, no additional text or formatting.
                 "Generate one flashcard about the concept of gravity in JSON format.",
                 generation_config={'max_output_tokens': 100}
             )
+            response_text = response.text
             
             return {
                 "status": "healthy",
-                "model": "gemini-1.5-pro-latest",
+                "model": GEMINI_MODEL_NAME,
                 "api_accessible": True,
-                "test_response_length": len(response.text) if response.text else 0
+                "requests": dict(self.metrics),
+                "test_response_length": len(response_text) if response_text else 0
             }
         except Exception as e:
             return {
                 "status": "unhealthy",
-                "model": "gemini-1.5-pro-latest",
+                "model": GEMINI_MODEL_NAME,
                 "api_accessible": False,
                 "error": str(e)
             }
\ No newline at end of file
@@ -0,0 +1,112 @@
+import os
+import logging
+import functools
+from typing import Any, Callable, Optional
+import diskcache
+import xxhash
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+CACHE_DIR = os.getenv('CACHE_DIR', './cache')
+DEFAULT_EXPIRE_SECONDS = 7 * 24 * 60 * 60  # 1 week
+
+_MISSING = object()
+_cache = None
+
+def get_cache() -> diskcache.Cache:
+    """Return the process-wide on-disk result cache, creating it on first use"""
+    global _cache
+    if _cache is None:
+        _cache = diskcache.Cache(CACHE_DIR)
+    return _cache
+
+def content_key(*parts: Any) -> str:
+    """
+    Hash the given parts into a cache key
+
+    Args:
+        parts: str, bytes-like (including contiguous numpy arrays), numbers or None
+
+    Returns:
+        128-bit xxh3 hex digest
+    """
+    hasher = xxhash.xxh3_128()
+    for part in parts:
+        if isinstance(part, str):
+            part = part.encode('utf-8')
+        elif part is None or isinstance(part, (int, float)):
+            part = repr(part).encode('utf-8')
+        hasher.update(part)
+        hasher.update(b'\x00')  # Separator so ("ab", "c") and ("a", "bc") differ
+    return hasher.hexdigest()
+
+def file_hash(path: str, chunk_size: int = 1 << 20) -> str:
+    """
+    Stream a file through xxh3 without loading it into memory
+
+    Args:
+        path: Path to file
+        chunk_size: Bytes read per iteration
+
+    Returns:
+        128-bit xxh3 hex digest of the file contents
+    """
+    hasher = xxhash.xxh3_128()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+def cached(key: Callable[..., str], expire: Optional[int] = DEFAULT_EXPIRE_SECONDS,
+           should_cache: Callable[[Any], bool] = bool):
+    """
+    Memoize a function in the on-disk result cache
+
+    Args:
+        key: Called with the function's arguments, returns the cache key
+        expire: Seconds until an entry expires (None keeps it until evicted)
+        should_cache: Called with the result, decides whether to store it
+
+    The wrapper's peek() takes the same arguments and only reads the cache,
+    letting callers skip expensive setup such as acquiring a semaphore on a hit.
+    """
+    def decorator(func):
+        def lookup(cache_key):
+            # A broken cache must never fail the request
+            try:
+                return get_cache().get(cache_key, default=_MISSING)
+            except Exception as e:
+                logger.warning(f"Cache lookup failed for {func.__qualname__}: {e}")
+                return _MISSING
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            cache_key = f"{func.__qualname__}:{key(*args, **kwargs)}"
+
+            result = lookup(cache_key)
+            if result is not _MISSING:
+                logger.info(f"Cache hit for {func.__qualname__}")
+                return result
+
+            result = func(*args, **kwargs)
+
+            if should_cache(result):
+                try:
+                    get_cache().set(cache_key, result, expire=expire)
+                except Exception as e:
+                    logger.warning(f"Cache store failed for {func.__qualname__}: {e}")
+
+            return result
+
+        def peek(*args, **kwargs):
+            """Return the cached result for these arguments without calling the function, None on a miss"""
+            result = lookup(f"{func.__qualname__}:{key(*args, **kwargs)}")
+            return None if result is _MISSING else result
+
+        wrapper.peek = peek
+        return wrapper
+    return decorator
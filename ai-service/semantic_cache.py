@@ -0,0 +1,204 @@
+import os
+import json
+import base64
+import logging
+import threading
+from typing import List, Dict, Any, Optional
+import numpy as np
+from dotenv import load_dotenv
+from result_cache import CACHE_DIR
+
+# Load environment variables
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+MAX_ENTRIES = 10000  # Oldest entries are evicted beyond this, keeping the linear index scan cheap
+
+class SemanticCache:
+    def __init__(self, cache_dir: Optional[str] = None, model_name: str = 'all-MiniLM-L6-v2',
+                 threshold: float = 0.95, max_length_ratio: float = 0.1, max_entries: int = MAX_ENTRIES):
+        """
+        Embedding-similarity cache returning flashcards for near-duplicate texts
+
+        Args:
+            cache_dir: Directory holding the append-only entries file
+            model_name: sentence-transformers model used for embeddings
+            threshold: Minimum cosine similarity for a hit
+            max_length_ratio: Maximum relative length difference for a hit
+            max_entries: Maximum number of cached texts
+        """
+        self.cache_dir = cache_dir or os.path.join(CACHE_DIR, 'semantic')
+        self.model_name = model_name
+        self.threshold = threshold
+        self.max_length_ratio = max_length_ratio
+        self.max_entries = max_entries
+        # One JSON line per entry holding its embedding and flashcards; the FAISS index is
+        # rebuilt from it on startup, so inserts only ever append a line
+        self.entries_path = os.path.join(self.cache_dir, 'entries.jsonl')
+
+        self._embed = None
+        self.index = None
+        self.payloads: List[Dict[str, Any]] = []
+        self.available = True
+        self._lock = threading.Lock()
+
+    def _load(self) -> bool:
+        """Load the embedding model and index on first use"""
+        with self._lock:
+            if self._embed is not None:
+                return True
+            if not self.available:
+                return False
+
+            try:
+                import faiss
+                from sentence_transformers import SentenceTransformer
+
+                embed = SentenceTransformer(self.model_name)
+            except Exception as e:
+                # The semantic cache is optional; run without it
+                logger.warning(f"Semantic cache unavailable: {e}")
+                self.available = False
+                return False
+
+            self.index = faiss.IndexFlatIP(embed.get_sentence_embedding_dimension())
+            self.payloads = []
+            vectors = []
+            skipped = 0
+            if os.path.exists(self.entries_path):
+                with open(self.entries_path) as f:
+                    for line in f:
+                        try:
+                            entry = json.loads(line)
+                            vector = np.frombuffer(base64.b64decode(entry.pop("vector")), dtype=np.float32)
+                        except Exception:
+                            # A write cut short by a crash leaves a partial last line
+                            skipped += 1
+                            continue
+                        if vector.shape[0] != self.index.d:
+                            continue
+                        vectors.append(vector)
+                        self.payloads.append(entry)
+            if vectors:
+                self.index.add(np.stack(vectors))
+            if skipped:
+                # Rewrite without the bad lines so later appends don't land on a partial one
+                logger.warning(f"Skipped {skipped} unreadable semantic cache entries")
+                try:
+                    self._compact()
+                except OSError as e:
+                    logger.warning(f"Failed to compact semantic cache: {e}")
+
+            self._embed = embed
+            logger.info(f"Semantic cache loaded with {len(self.payloads)} entries")
+            return True
+
+    def embed(self, text: str) -> Optional[np.ndarray]:
+        """
+        Embed a whole document as the normalized mean of its passage embeddings,
+        since the embedding model only reads the first few hundred tokens of its input
+
+        Args:
+            text: Cleaned input text
+
+        Returns:
+            (1, dim) float32 vector to pass to lookup and add, or None if the cache is unavailable
+        """
+        if not self._load():
+            return None
+
+        passages = [text[i:i + 1000] for i in range(0, len(text), 1000)] or ['']
+        embeddings = self._embed.encode(passages, normalize_embeddings=True)
+        vec = embeddings.mean(axis=0, keepdims=True)
+        return (vec / np.linalg.norm(vec, axis=1, keepdims=True)).astype(np.float32)
+
+    def lookup(self, text: str, num_cards: int, vec: Optional[np.ndarray]) -> Optional[List[Dict[str, Any]]]:
+        """
+        Return cached flashcards for a sufficiently similar earlier text
+
+        Args:
+            text: Cleaned input text
+            num_cards: Requested number of cards, which must match the cached entry
+            vec: Embedding of text from embed()
+
+        Returns:
+            Cached flashcards, or None on a miss
+        """
+        if vec is None:
+            return None
+
+        with self._lock:
+            if self.index.ntotal == 0:
+                return None
+            scores, ids = self.index.search(vec, min(5, self.index.ntotal))
+            payloads = self.payloads
+
+        for score, idx in zip(scores[0], ids[0]):
+            if idx < 0 or idx >= len(payloads) or score <= self.threshold:
+                break
+            payload = payloads[idx]
+            length_ratio = abs(payload["text_length"] - len(text)) / max(len(text), 1)
+            if payload["num_cards"] == num_cards and length_ratio <= self.max_length_ratio:
+                logger.info(f"Semantic cache hit (similarity {score:.3f})")
+                return payload["flashcards"]
+
+        return None
+
+    def add(self, text: str, num_cards: int, flashcards: List[Dict[str, Any]], vec: Optional[np.ndarray]):
+        """
+        Store flashcards generated for a text and append them to the entries file
+
+        Args:
+            text: Cleaned input text
+            num_cards: Requested number of cards
+            flashcards: Validated flashcards
+            vec: Embedding of text from embed()
+        """
+        if vec is None:
+            return
+
+        payload = {
+            "num_cards": num_cards,
+            "text_length": len(text),
+            "flashcards": flashcards
+        }
+        line = self._entry_line(payload, vec[0])
+
+        with self._lock:
+            try:
+                self.index.add(vec)
+                self.payloads.append(payload)
+
+                os.makedirs(self.cache_dir, exist_ok=True)
+                with open(self.entries_path, 'a') as f:
+                    f.write(line)
+
+                if self.index.ntotal > self.max_entries:
+                    self._evict()
+            except Exception as e:
+                logger.warning(f"Failed to update semantic cache: {e}")
+
+    @staticmethod
+    def _entry_line(payload: Dict[str, Any], vector: np.ndarray) -> str:
+        """Serialize one entry as a line of the entries file"""
+        encoded = base64.b64encode(np.ascontiguousarray(vector, dtype=np.float32).tobytes()).decode('ascii')
+        return json.dumps(dict(payload, vector=encoded)) + '\n'
+
+    def _evict(self):
+        """Drop the oldest tenth of entries and compact the entries file (caller holds the lock)"""
+        evict = self.index.ntotal - self.max_entries + self.max_entries // 10
+        self.index.remove_ids(np.arange(evict, dtype=np.int64))
+        self.payloads = self.payloads[evict:]
+        # Happens once per max_entries // 10 inserts rather than on every insert
+        self._compact()
+        logger.info(f"Evicted {evict} semantic cache entries")
+
+    def _compact(self):
+        """Rewrite the entries file from memory via a temporary file (caller holds the lock)"""
+        vectors = self.index.reconstruct_n(0, self.index.ntotal)
+        tmp_path = self.entries_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            for vector, payload in zip(vectors, self.payloads):
+                f.write(self._entry_line(payload, vector))
+        os.replace(tmp_path, self.entries_path)
@@ -0,0 +1,12 @@
+"""
+WSGI entrypoint for production serving, e.g.
+
+    gunicorn -k gthread --threads 8 --workers 1 --timeout 600 wsgi:app
+
+Each worker process loads its own Whisper model, so scale with threads
+(which share the models) rather than workers.
+"""
+from app import app
+
+if __name__ == '__main__':
+    app.run(host='0.0.0.0', port=8080)
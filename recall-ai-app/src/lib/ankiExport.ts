@@ -4,13 +4,8 @@ import { Flashcard } from '@/types/flashcard';
 
 const AI_SERVICE_URL = "http://localhost:8080";
 
-export interface AnkiExportResponse {
-  success: boolean;
-  filename: string;
-  data: string; // base64 encoded .apkg file
-  size: number;
-  cards_exported: number;
-  error?: string;
+export interface AnkiExportErrorResponse {
+  error: string;
 }
 
 export async function exportToAnki(
@@ -32,29 +27,20 @@ export async function exportToAnki(
     });
 
     if (!response.ok) {
-      throw new Error(`HTTP error! status: ${response.status}`);
+      // Errors are still returned as JSON
+      const result: AnkiExportErrorResponse | null = await response.json().catch(() => null);
+      throw new Error(result?.error || `HTTP error! status: ${response.status}`);
     }
 
-    const result: AnkiExportResponse = await response.json();
-
-    if (!result.success) {
-      throw new Error(result.error || 'Failed to export to Anki');
-    }
-
-    // Convert base64 to blob and trigger download
-    const binaryString = atob(result.data);
-    const bytes = new Uint8Array(binaryString.length);
-    for (let i = 0; i < binaryString.length; i++) {
-      bytes[i] = binaryString.charCodeAt(i);
-    }
-
-    const blob = new Blob([bytes], { type: 'application/octet-stream' });
+    // The .apkg file is streamed back as a binary attachment
+    const blob = await response.blob();
+    const filename = `${deckName}.apkg`;
     const url = URL.createObjectURL(blob);
     
     // Create download link
     const a = document.createElement('a');
     a.href = url;
-    a.download = result.filename;
+    a.download = filename;
     a.style.display = 'none';
     
     document.body.appendChild(a);
@@ -64,7 +50,7 @@ export async function exportToAnki(
     // Clean up
     URL.revokeObjectURL(url);
     
-    console.log(`Successfully exported ${result.cards_exported} cards to ${result.filename}`);
+    console.log(`Successfully exported ${cards.length} cards to ${filename}`);
     
   } catch (error) {
     console.error('Error exporting to Anki:', error);